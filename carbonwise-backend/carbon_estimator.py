@@ -1,99 +1,21 @@
-# import os
-# import re
-# import requests
-# from dotenv import load_dotenv
-
-# load_dotenv()
-
-# # Load multiple API keys like DETAILS_API_KEY1, DETAILS_API_KEY2...
-# API_KEYS = [v for k, v in os.environ.items() if k.startswith("DETAILS_API_KEY")]
-
-# OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
-
-
-# def call_openrouter_api(system_prompt: str, user_content: str) -> int:
-#     """
-#     Call OpenRouter API with fallback across multiple API keys.
-#     Returns a single integer (carbon footprint estimate in kg).
-#     """
-#     headers_template = {"Content-Type": "application/json"}
-#     data = {
-#     "model": "qun-3-2b",
-#     "messages": [
-#         {"role": "system", "content": system_prompt},
-#         {"role": "user", "content": user_content},
-#     ],
-#     }
-
-#     last_error = None
-#     for idx, api_key in enumerate(API_KEYS, start=1):
-#         headers = headers_template.copy()
-#         headers["Authorization"] = f"Bearer {api_key}"
-
-#         try:
-#             response = requests.post(OPENROUTER_URL, headers=headers, json=data, timeout=20)
-
-#             try:
-#                 resp_json = response.json()
-#             except ValueError:
-#                 last_error = f"[Key {idx}] Invalid JSON response"
-#                 continue
-
-#             if response.status_code == 200 and "choices" in resp_json:
-#                 raw_output = resp_json["choices"][0]["message"]["content"].strip()
-
-#                 # ✅ Extract last integer in text
-#                 numbers = re.findall(r"\d+", raw_output)
-#                 if numbers:
-#                     return int(numbers[-1])  # Final carbon estimate in kg
-#                 else:
-#                     last_error = f"[Key {idx}] No integer found in output: {raw_output}"
-#                     continue
-#             else:
-#                 last_error = f"[Key {idx}] API failed: {response.status_code} - {response.text}"
-#                 continue
-
-#         except requests.exceptions.RequestException as e:
-#             last_error = f"[Key {idx}] Network/API error: {e}"
-#             continue
-
-#     raise Exception(f"❌ All API keys failed.\nLast error: {last_error}")
-
-
-# def estimate_carbon(product_description: str) -> int:
-#     """
-#     Estimate carbon footprint of a product using LLM.
-#     Returns an integer value (kg of CO₂e).
-#     """
-#     print("🌍 Estimating carbon footprint...")
-
-#     system_prompt = """
-#     You are an expert in carbon footprint estimation.
-#     Use the following approximate emission factors (cradle-to-gate averages):
-#     - Stainless steel: 6.15 kg CO₂e per kg
-#     - Plastic (generic): 2.5 kg CO₂e per kg
-#     - Glass: 1.2 kg CO₂e per kg
-#     - Aluminum: 16.5 kg CO₂e per kg
-#     - Wood: 0.5 kg CO₂e per kg
-#     - Paper/Cardboard: 1.1 kg CO₂e per kg
-
-#     Steps:
-#     1. Estimate the approximate weight (in kg) of the product from description.
-#     2. Multiply by the relevant emission factor.
-#     3. Round to the nearest integer (kg CO₂e).
-
-#     Return only ONE integer number. No units, no text.
-#     If material is unclear, choose the closest match.
-#     If multiple items (like a set), multiply by the quantity.
-#     For any smartphone, cap the estimate at 50 - 100 kg.
-#     """
-#     return call_openrouter_api(system_prompt, product_description)
-
-
 import os
 import re
+import asyncio
+import hashlib
+import time
+import httpx
+import orjson
+import diskcache
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
 import google.generativeai as genai
 from dotenv import load_dotenv
+from prometheus_client import Counter
+from aiolimiter import AsyncLimiter
+from google.api_core.exceptions import ResourceExhausted
+
+from http_client import get_client
 
 # --- Setup ---
 # Load environment variables from the .env file
@@ -105,39 +27,100 @@ if not api_key:
     raise ValueError("❌ GOOGLE_API key not found. Please make sure it's set in your .env file.")
 genai.configure(api_key=api_key)
 
+# Optional OpenRouter fallback: load multiple API keys like DETAILS_API_KEY1, DETAILS_API_KEY2...
+API_KEYS = [v for k, v in os.environ.items() if k.startswith("DETAILS_API_KEY")]
 
-def call_gemini_api(system_prompt: str, user_content: str) -> int:
-    """
-    Call Gemini API for carbon footprint estimation.
-    Returns a single integer (carbon footprint estimate in kg).
-    """
-    # Combine system + user prompt since Gemini works better with unified instructions
-    prompt = f"{system_prompt.strip()}\n\nProduct Description: {user_content.strip()}"
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "qwen/qwen3-8b")
 
-    try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
-        raw_output = response.text.strip()
-
-        # ✅ Extract last integer in text
-        numbers = re.findall(r"\d+", raw_output)
-        if numbers:
-            return int(numbers[-1])  # Final carbon estimate in kg
-        else:
-            raise ValueError(f"No integer found in output: {raw_output}")
+# Hedging: start the next key if the current one hasn't answered within HEDGE_DELAY seconds.
+# Each attempt gets HEDGE_TIMEOUT seconds in total (httpx timeouts are per read,
+# so a slowly trickling stream would never hit them).
+HEDGE_DELAY = 2.0
+HEDGE_TIMEOUT = 6.0
 
-    except Exception as e:
-        raise Exception(f"❌ Gemini API error: {e}")
+# --- Rate limiting ---
+# Per-key concurrency cap plus a token bucket, so bursts of /analyze calls stay
+# under provider RPM limits instead of tripping 429s and backoff.
+KEY_CONCURRENCY = 8
+KEY_RATE_PER_MINUTE = 500
+THROTTLE_WINDOW = 60.0
 
 
-def estimate_carbon(product_description: str) -> int:
+class KeyLimiter:
     """
-    Estimate carbon footprint of a product using Gemini.
-    Returns an integer value (kg of CO₂e).
+    Concurrency and rate limit for one API key.
+    After a 429 the key waits out Retry-After and runs at half rate for THROTTLE_WINDOW seconds.
     """
-    print("🌍 Estimating carbon footprint...")
 
-    system_prompt = """
+    def __init__(self, max_concurrency: int = KEY_CONCURRENCY, max_rate: int = KEY_RATE_PER_MINUTE):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._limiter = AsyncLimiter(max_rate, 60)
+        # While throttled, requests are also spaced evenly at half rate. A second
+        # token bucket would start full and let a burst through right after the 429.
+        self._throttled_interval = 60 / max(1, max_rate // 2)
+        self._next_throttled_at = 0.0
+        self._retry_at = 0.0
+        self._throttled_until = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self._semaphore:
+            delay = self._retry_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            now = time.monotonic()
+            if now < self._throttled_until:
+                start = max(now, self._next_throttled_at)
+                self._next_throttled_at = start + self._throttled_interval
+                if start > now:
+                    await asyncio.sleep(start - now)
+            async with self._limiter:
+                yield
+
+    def back_off(self, retry_after: Optional[str] = None) -> None:
+        try:
+            delay = float(retry_after) if retry_after else 1.0
+        except ValueError:
+            delay = 1.0  # HTTP-date form; not worth parsing for a short pause
+        now = time.monotonic()
+        self._retry_at = max(self._retry_at, now + delay)
+        self._throttled_until = now + THROTTLE_WINDOW
+        self._next_throttled_at = max(self._next_throttled_at, self._retry_at)
+
+
+GEMINI_LIMITER = KeyLimiter()
+KEY_LIMITERS = {key: KeyLimiter() for key in API_KEYS}
+
+# Last integer in an LLM reply, without building the list of every match.
+TRAILING_INT_RE = re.compile(r"(\d+)(?!.*\d)", re.S)
+# A reply that opens with an integer already followed by something other than
+# more digits or a decimal part: "42 kg" stops at 42, while "2.5", "1,200" and
+# "0.5 kg x 6 = 3" are read to the end and parsed like a full reply.
+LEADING_INT_RE = re.compile(r"\s*(\d+)(?=[^\d.,]|[.,]\D)")
+
+# Gemini structured output: the model must answer {"kg": <int>} (or one
+# {"row", "kg"} object per product when batched), so replies are a few tokens
+# long and parse with a single orjson.loads.
+GEMINI_MODEL = genai.GenerativeModel("gemini-1.5-flash", generation_config={
+    "response_mime_type": "application/json",
+    "response_schema": {"type": "object", "properties": {"kg": {"type": "integer"}}, "required": ["kg"]},
+    "max_output_tokens": 16,
+})
+GEMINI_BATCH_MODEL = genai.GenerativeModel("gemini-1.5-flash", generation_config={
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {"row": {"type": "integer"}, "kg": {"type": "integer"}},
+            "required": ["row", "kg"],
+        },
+    },
+})
+BATCH_TOKENS_PER_ROW = 16
+
+SYSTEM_PROMPT = """
     You are an expert in carbon footprint estimation.
     Use the following approximate emission factors (cradle-to-gate averages):
     - Stainless steel: 6.15 kg CO₂e per kg
@@ -163,14 +146,410 @@ def estimate_carbon(product_description: str) -> int:
     Return only ONE integer number. No units, no text.
     """
 
-    return call_gemini_api(system_prompt, product_description)
+# --- Response cache ---
+# Estimates are keyed on (prompt version, description), so editing SYSTEM_PROMPT
+# invalidates every cached answer. Hot keys live in an in-process LRU, backed by
+# an on-disk cache that survives restarts.
+PROMPT_VERSION = hashlib.blake2b(SYSTEM_PROMPT.encode(), digest_size=8).hexdigest()
+CACHE = diskcache.Cache("./llm_cache")
+CACHE_TTL = 86400 * 30
+MEMORY_CACHE_SIZE = 10_000
+_memory_cache: "OrderedDict[str, int]" = OrderedDict()
+
+
+def _cache_key(product_description: str) -> str:
+    return hashlib.blake2b(f"{PROMPT_VERSION}:{product_description}".encode(), digest_size=16).hexdigest()
+
+
+def _cache_get(key: str) -> Optional[int]:
+    if key in _memory_cache:
+        _memory_cache.move_to_end(key)
+        return _memory_cache[key]
+    value = CACHE.get(key)
+    if value is not None:
+        _memory_cache_put(key, value)
+    return value
+
+
+def _memory_cache_put(key: str, value: int) -> None:
+    _memory_cache[key] = value
+    _memory_cache.move_to_end(key)
+    if len(_memory_cache) > MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+
+def _cache_set(key: str, value: int) -> None:
+    _memory_cache_put(key, value)
+    CACHE.set(key, value, expire=CACHE_TTL)
+
+
+# --- In-flight deduplication ---
+# Concurrent requests for the same description share one LLM call
+# (singleflight) instead of each issuing their own. Direct and queued
+# estimates are tracked separately because a queued batch may itself fall
+# back to direct estimate_carbon calls for the same key.
+_inflight_direct: Dict[str, asyncio.Task] = {}
+_inflight_queued: Dict[str, asyncio.Task] = {}
+
+
+async def _singleflight(inflight: Dict[str, asyncio.Task], key: str, make_call):
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(make_call())
+        inflight[key] = task
+
+        def _done(t: asyncio.Task) -> None:
+            inflight.pop(key, None)
+            if not t.cancelled():
+                t.exception()  # mark retrieved even if every waiter went away
+
+        task.add_done_callback(_done)
+    # shield: one caller disconnecting must not cancel the call for the others
+    return await asyncio.shield(task)
+
+
+# --- Metrics ---
+# Estimates served, by how they were resolved: "deterministic" (emission-factor
+# lookup in main.py), "cache" or "llm".
+ESTIMATES = Counter("carbon_estimates_total", "Carbon estimates served, by resolution path.", ["path"])
+
+
+def _cache_lookup(key: str) -> Optional[int]:
+    value = _cache_get(key)
+    if value is not None:
+        ESTIMATES.labels(path="cache").inc()
+    return value
+
+
+async def call_gemini_api(system_prompt: str, user_content: str) -> int:
+    """
+    Call Gemini API for carbon footprint estimation.
+    Returns a single integer (carbon footprint estimate in kg).
+    """
+    # Combine system + user prompt since Gemini works better with unified instructions
+    prompt = f"{system_prompt.strip()}\n\nProduct Description: {user_content.strip()}"
+
+    try:
+        async with GEMINI_LIMITER.slot():
+            response = await GEMINI_MODEL.generate_content_async(prompt)
+        return int(orjson.loads(response.text)["kg"])  # Final carbon estimate in kg
+
+    except ResourceExhausted as e:
+        GEMINI_LIMITER.back_off()
+        raise Exception(f"❌ Gemini API error: {e}")
+    except Exception as e:
+        raise Exception(f"❌ Gemini API error: {e}")
+
+
+async def call_gemini_batch_api(system_prompt: str, descriptions: List[str]) -> Dict[int, int]:
+    """
+    Call Gemini once for several products (row-marshaled prompt).
+    Returns a {row number: integer estimate} mapping for the rows it could parse.
+    """
+    rows = "\n".join(f"{i}) {d.strip()}" for i, d in enumerate(descriptions, start=1))
+    prompt = (
+        f"{system_prompt.strip()}\n\n"
+        f"For each of the following {len(descriptions)} products, return its row number and "
+        f"one integer estimate.\n{rows}"
+    )
+
+    try:
+        async with GEMINI_LIMITER.slot():
+            response = await GEMINI_BATCH_MODEL.generate_content_async(
+                prompt, generation_config={"max_output_tokens": BATCH_TOKENS_PER_ROW * len(descriptions)}
+            )
+        estimates = orjson.loads(response.text)
+    except ResourceExhausted as e:
+        GEMINI_LIMITER.back_off()
+        raise Exception(f"❌ Gemini API error: {e}")
+    except Exception as e:
+        raise Exception(f"❌ Gemini API error: {e}")
+
+    return {int(e["row"]): int(e["kg"]) for e in estimates if isinstance(e, dict) and "row" in e and "kg" in e}
+
+
+async def read_streamed_integer(response: httpx.Response, idx: int) -> int:
+    """
+    Read an OpenRouter SSE stream until the reply's leading integer is
+    complete, then stop; leaving the stream context closes the connection, so
+    the model stops generating any trailing explanation. Replies that don't
+    open with a bare integer are read in full and use the last integer.
+    """
+    raw_output = ""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue  # blank separators and ": keep-alive" comments
+        payload = line[5:].strip()
+        if payload == "[DONE]":
+            break
+        try:
+            # orjson: C-level parse of each SSE event payload.
+            event = orjson.loads(payload)
+        except ValueError:
+            raise ValueError(f"[Key {idx}] Invalid JSON in stream: {payload}")
+        choices = event.get("choices") or [{}]
+        raw_output += (choices[0].get("delta") or {}).get("content") or ""
+
+        match = LEADING_INT_RE.match(raw_output)
+        if match:
+            return int(match.group(1))  # Final carbon estimate in kg
+
+    # Stream ended right after the digits, or the reply wasn't a bare integer.
+    match = TRAILING_INT_RE.search(raw_output)
+    if not match:
+        raise ValueError(f"[Key {idx}] No integer found in output: {raw_output}")
+    return int(match.group(1))
+
+
+async def call_openrouter_api(system_prompt: str, user_content: str, hedge_delay: float = HEDGE_DELAY) -> int:
+    """
+    Call OpenRouter API with hedged fallback across multiple API keys.
+    Key 1 is fired first; each further key is launched after `hedge_delay`
+    seconds without a response (or as soon as an earlier key fails).
+    The first valid answer wins and the remaining attempts are cancelled.
+    Returns a single integer (carbon footprint estimate in kg).
+    """
+    headers_template = {"Content-Type": "application/json"}
+    data = {
+        "model": OPENROUTER_MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content},
+        ],
+        "stream": True,
+    }
+
+    client = get_client()
+
+    async def attempt(idx: int, api_key: str) -> int:
+        headers = headers_template.copy()
+        headers["Authorization"] = f"Bearer {api_key}"
+
+        limiter = KEY_LIMITERS[api_key]
+        async with limiter.slot():
+            async with client.stream("POST", OPENROUTER_URL, headers=headers, json=data) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode(errors="replace")
+                    if response.status_code == 429:
+                        limiter.back_off(response.headers.get("Retry-After"))
+                        raise ValueError(f"[Key {idx}] Rate limited: {body}")
+                    raise ValueError(f"[Key {idx}] API failed: {response.status_code} - {body}")
+                return await read_streamed_integer(response, idx)
+
+    async def try_key(idx: int, api_key: str) -> int:
+        try:
+            return await asyncio.wait_for(attempt(idx, api_key), HEDGE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise ValueError(f"[Key {idx}] Timed out after {HEDGE_TIMEOUT:g}s")
+        except httpx.HTTPError as e:
+            raise ValueError(f"[Key {idx}] Network/API error: {e}")
+
+    queued = list(enumerate(API_KEYS, start=1))
+    pending = set()
+    last_error = None
+    try:
+        while queued or pending:
+            if queued:
+                pending.add(asyncio.create_task(try_key(*queued.pop(0))))
+            done, pending = await asyncio.wait(
+                pending, timeout=hedge_delay if queued else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                try:
+                    return task.result()
+                except Exception as e:
+                    last_error = str(e)
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise Exception(f"❌ All API keys failed.\nLast error: {last_error}")
+
+
+async def estimate_carbon(product_description: str) -> int:
+    """
+    Estimate carbon footprint of a product using Gemini.
+    OpenRouter is used as a fallback when DETAILS_API_KEY* keys are configured.
+    Returns an integer value (kg of CO₂e).
+    """
+    key = _cache_key(product_description)
+    resolved = _cache_lookup(key)
+    if resolved is not None:
+        return resolved
+    return await _singleflight(_inflight_direct, key, lambda: _estimate_with_llm(product_description, key))
+
+
+async def _estimate_with_llm(product_description: str, key: str) -> int:
+    print("🌍 Estimating carbon footprint...")
+
+    try:
+        value = await call_gemini_api(SYSTEM_PROMPT, product_description)
+    except Exception as e:
+        if not API_KEYS:
+            raise
+        print(f"{e}. Retrying via OpenRouter...")
+        value = await call_openrouter_api(SYSTEM_PROMPT, product_description)
+
+    ESTIMATES.labels(path="llm").inc()
+    _cache_set(key, value)
+    return value
+
+
+async def estimate_carbon_batch(product_descriptions: List[str]) -> List[Optional[int]]:
+    """
+    Estimate carbon footprints for several products with one Gemini call per
+    MAX_BATCH_SIZE products.
+    Cached descriptions are answered without a call; rows
+    missing from the batched reply are retried one by one via estimate_carbon.
+    Returns one integer (kg of CO₂e) per description, or None where estimation failed.
+    """
+    keys = [_cache_key(d) for d in product_descriptions]
+    results = [_cache_lookup(k) for k in keys]
+    uncached = [i for i, r in enumerate(results) if r is None]
+    if not uncached:
+        return results
+    print(f"🌍 Estimating carbon footprint for {len(uncached)} products...")
+
+    # At most MAX_BATCH_SIZE rows per call, so the reply stays within the model's output cap.
+    chunks = [uncached[j:j + MAX_BATCH_SIZE] for j in range(0, len(uncached), MAX_BATCH_SIZE)]
+    replies = await asyncio.gather(
+        *(call_gemini_batch_api(SYSTEM_PROMPT, [product_descriptions[i] for i in chunk]) for chunk in chunks),
+        return_exceptions=True
+    )
+
+    for chunk, parsed in zip(chunks, replies):
+        if isinstance(parsed, Exception):
+            print(f"{parsed}. Retrying products individually...")
+            continue
+        for row, i in enumerate(chunk, start=1):
+            if row in parsed:
+                results[i] = parsed[row]
+                ESTIMATES.labels(path="llm").inc()
+                _cache_set(keys[i], parsed[row])
+
+    # estimate_carbon caches the stragglers it resolves.
+    stragglers = [i for i in uncached if results[i] is None]
+    if stragglers:
+        retried = await asyncio.gather(
+            *(estimate_carbon(product_descriptions[i]) for i in stragglers), return_exceptions=True
+        )
+        for i, r in zip(stragglers, retried):
+            if isinstance(r, Exception):
+                print(f"Carbon estimate for product {i + 1} failed: {r}")
+            else:
+                results[i] = r
+    return results
+
+
+# --- Warm-up ---
+WARM_UP_TIMEOUT = httpx.Timeout(3)
+
+
+async def warm_up() -> None:
+    """
+    Open LLM connections before the first real request pays DNS + TCP + TLS.
+    Gemini goes through the SDK's own gRPC channel, so it is warmed with a free
+    count_tokens call; OpenRouter is warmed through the shared httpx pool.
+    """
+    tasks = [asyncio.wait_for(GEMINI_MODEL.count_tokens_async("ping"), WARM_UP_TIMEOUT.read)]
+    if API_KEYS:
+        tasks.append(get_client().head(OPENROUTER_URL, timeout=WARM_UP_TIMEOUT))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for r in results:
+        if isinstance(r, Exception):
+            print(f"LLM warm-up failed (ignored): {r}")
+
+
+# --- Micro-batching ---
+# Concurrent single-product estimates are queued and flushed as one batched call
+# every MAX_BATCH_WAIT seconds (or at MAX_BATCH_SIZE items), trading ~50ms of
+# latency for far fewer LLM round-trips under load.
+MAX_BATCH_SIZE = 16
+MAX_BATCH_WAIT = 0.05
+_batch_queue: "Optional[asyncio.Queue[tuple[str, asyncio.Future]]]" = None
+_batch_worker: Optional[asyncio.Task] = None
+_flushing: set = set()
+
+
+async def batch_worker(queue: asyncio.Queue) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        items = [await queue.get()]
+        deadline = loop.time() + MAX_BATCH_WAIT
+        while len(items) < MAX_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Flush in the background so the next batch can fill while this one is in flight.
+        task = asyncio.create_task(_flush_batch(items))
+        _flushing.add(task)
+        task.add_done_callback(_flushing.discard)
+
+
+async def _flush_batch(items: list) -> None:
+    try:
+        results = await estimate_carbon_batch([d for d, _ in items])
+    except Exception as e:
+        results = [e] * len(items)
+    for (_, future), result in zip(items, results):
+        if future.done():
+            continue  # caller went away
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        elif result is None:
+            future.set_exception(Exception("❌ Carbon estimation failed"))
+        else:
+            future.set_result(result)
+
+
+def start_batch_worker() -> None:
+    global _batch_queue, _batch_worker
+    if _batch_worker is None:
+        _batch_queue = asyncio.Queue()
+        _batch_worker = asyncio.create_task(batch_worker(_batch_queue))
+
+
+async def stop_batch_worker() -> None:
+    global _batch_queue, _batch_worker
+    if _batch_worker is not None:
+        _batch_worker.cancel()
+        try:
+            await _batch_worker
+        except asyncio.CancelledError:
+            pass
+        _batch_queue, _batch_worker = None, None
+
+
+async def estimate_carbon_queued(product_description: str) -> int:
+    """
+    Like estimate_carbon, but LLM calls are micro-batched with other concurrent requests.
+    Cached answers return immediately without queueing.
+    """
+    key = _cache_key(product_description)
+    resolved = _cache_lookup(key)
+    if resolved is not None:
+        return resolved
+    if _batch_worker is None:
+        return await estimate_carbon(product_description)
+    return await _singleflight(_inflight_queued, key, lambda: _enqueue(product_description))
+
+
+async def _enqueue(product_description: str) -> int:
+    future = asyncio.get_running_loop().create_future()
+    await _batch_queue.put((product_description, future))
+    return await future
 
 
 # Example usage
 if __name__ == "__main__":
     try:
         desc = "Product: Stainless Steel Spoon Set, Material: Stainless Steel, Weight: 25g each, Quantity: 12"
-        carbon_value = estimate_carbon(desc)
+        carbon_value = asyncio.run(estimate_carbon(desc))
         print(f"✅ Estimated Carbon Footprint: {carbon_value} kg CO₂e")
     except Exception as e:
         print(str(e))
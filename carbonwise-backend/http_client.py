@@ -0,0 +1,33 @@
+from typing import Optional
+
+import httpx
+
+# --- Shared HTTP connection pool ---
+# One AsyncClient per process so Keep-Alive reuses TCP/TLS sessions across
+# requests instead of paying a fresh handshake on every outbound call. HTTP/2
+# lets concurrent requests to the same host share one connection.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide pooled AsyncClient, creating it on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=16, keepalive_expiry=60),
+            timeout=httpx.Timeout(20, connect=5),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """
+    Close the pooled client (called on application shutdown).
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
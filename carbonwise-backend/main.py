@@ -1,17 +1,24 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import List, Dict, Any, Optional, Tuple
-import pandas as pd
 import numpy as np
 import re
-import time
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from collections import OrderedDict
+import functools
+import csv
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import diskcache
+import ahocorasick
+from selectolax.lexbor import LexborHTMLParser
 import uvicorn
+from prometheus_client import make_asgi_app
 
-from carbon_estimator import estimate_carbon
+from carbon_estimator import estimate_carbon_queued, estimate_carbon_batch, start_batch_worker, stop_batch_worker, ESTIMATES
+from carbon_estimator import warm_up as llm_warm_up
+from http_client import get_client, close_client
 
 app = FastAPI(title="CarbonWise API")
 
@@ -19,11 +26,19 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
 )
+app.mount("/metrics", make_asgi_app())
 
 # --- Models ---
 class ProductAnalysisRequest(BaseModel):
     url: str
 
+# Each URL is a scrape (and possibly a Selenium fallback), so one request may
+# not fan out without bound.
+MAX_BATCH_URLS = 20
+
+class BatchAnalysisRequest(BaseModel):
+    urls: List[str] = Field(..., max_length=MAX_BATCH_URLS)
+
 class Recommendation(BaseModel):
     product_name: str
     image_url: Optional[str]
@@ -45,18 +60,95 @@ class ProductAnalysisResponse(BaseModel):
     recommendations: List[Recommendation]
     error: Optional[str] = None
 
+class BatchAnalysisResponse(BaseModel):
+    results: List[ProductAnalysisResponse]
+
+# --- Datasets ---
+# Both CSVs are static, so they are parsed once at import instead of per request.
+def load_emission_factors(path: str = 'emission_factor_dataset.csv') -> Dict[str, float]:
+    # Columns: Material, Material_type, Emission_Factor (kg CO2 eq/kg), tab-separated.
+    ef_map = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter='\t')
+        next(reader, None)
+        for row in reader:
+            if len(row) >= 3 and row[0].strip():
+                ef_map.setdefault(row[0].strip().lower(), float(row[2]))
+    return ef_map
+
+EF_MAP = load_emission_factors()
+KNOWN_MATERIALS = tuple(EF_MAP)
+
+# Products are stored per category as struct-of-arrays so recommendation scoring
+# is a single vectorized multiply; each row's emission factor is resolved here once.
+PRODUCT_DTYPE = np.dtype([
+    ('title', object), ('img_url', object), ('material', object), ('link', object),
+    ('weight', np.float64), ('quantity', np.float64), ('emission_factor', np.float64),
+])
+
+def parse_float(value: Optional[str]) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def build_product_array(rows: List[dict]) -> np.ndarray:
+    products = np.empty(len(rows), dtype=PRODUCT_DTYPE)
+    for i, row in enumerate(rows):
+        material = row['Material'] or None
+        products[i] = (
+            row['Title'] or None, row['img_url'] or None, material, row['Link'] or None,
+            parse_float(row['Weight Value']), parse_float(row['Net Quantity']),
+            EF_MAP.get(material.strip().lower(), 2.5) if material else 2.5,
+        )
+    return products
+
+def load_products(path: str = 'amazon_products.csv') -> Dict[str, np.ndarray]:
+    rows_by_category = {}
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            if row['Search Query']:
+                rows_by_category.setdefault(row['Search Query'], []).append(row)
+    return {category: build_product_array(rows) for category, rows in rows_by_category.items()}
+
+PRODUCTS_BY_CATEGORY = load_products()
+SORTED_CATEGORIES = sorted(PRODUCTS_BY_CATEGORY, key=len, reverse=True)
+# Lowercased category -> catalog category, in SORTED_CATEGORIES order (longest first).
+CATEGORY_BY_LOWER = {}
+for category in SORTED_CATEGORIES:
+    CATEGORY_BY_LOWER.setdefault(category.lower(), category)
+CATEGORY_KEYWORDS = tuple(CATEGORY_BY_LOWER)
+CATEGORY_RANK = {keyword: rank for rank, keyword in enumerate(CATEGORY_KEYWORDS)}
+
 # --- Helpers ---
-def find_best_material_match(text_to_search: str, known_materials: list) -> Optional[str]:
-    if not text_to_search or not isinstance(text_to_search, str):
+@functools.lru_cache(maxsize=8)
+def build_keyword_matcher(keywords: tuple) -> ahocorasick.Automaton:
+    automaton = ahocorasick.Automaton()
+    for keyword in keywords:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return automaton
+
+def find_best_material_match(text_to_search: str, known_materials: tuple) -> Optional[str]:
+    if not text_to_search or not isinstance(text_to_search, str) or not known_materials:
+        return None
+    # Leftmost match wins, longest among those starting at the same position
+    # (an exact match of the whole text is therefore always picked).
+    best, best_start = None, None
+    for end, m in build_keyword_matcher(known_materials).iter(text_to_search.lower()):
+        start = end - len(m) + 1
+        if best is None or start < best_start or (start == best_start and len(m) > len(best)):
+            best, best_start = m, start
+    return best
+
+def find_category(product_name: str) -> Optional[str]:
+    if not product_name or not CATEGORY_KEYWORDS:
         return None
-    lower_text = text_to_search.lower()
-    for m in known_materials:
-        if m == lower_text:
-            return m
-            
-    material_regex = re.compile('|'.join(re.escape(m) for m in known_materials))
-    match = material_regex.search(lower_text)
-    return match.group(0) if match else None
+    # Every category in the name in one automaton pass; the longest one wins.
+    found = {keyword for _, keyword in build_keyword_matcher(CATEGORY_KEYWORDS).iter(product_name.lower())}
+    if not found:
+        return None
+    return CATEGORY_BY_LOWER[min(found, key=CATEGORY_RANK.__getitem__)]
 
 def convert_to_kg(value: float, unit: Optional[str]) -> float:
     if unit is None:
@@ -71,180 +163,428 @@ def convert_to_kg(value: float, unit: Optional[str]) -> float:
     return value
 
 # --- Web Scraper ---
-def extract_specs(driver) -> dict:
-    materials_found, weights, quantities = [], OrderedDict(), OrderedDict()
-    priority_groups = [
-        ["#productDetails_techSpec_section_1 tr", "#productDetails_techSpec_section_2 tr"],
-        ["table.a-keyvalue tr"],
-        ["#productOverview_feature_div table tr"],
-        ["#detailBullets_feature_div li", "#productDetails_detailBullets_sections1 tr"]
-    ]
-    for selectors in priority_groups:
-        rows = []
-        for sel in selectors:
-            try:
-                rows.extend(driver.find_elements(By.CSS_SELECTOR, sel))
-            except Exception:
-                pass
-        for row in rows:
-            try:
-                if row.tag_name.lower() == "tr":
-                    cells = row.find_elements(By.TAG_NAME, "th") + row.find_elements(By.TAG_NAME, "td")
-                    if len(cells) < 2:
-                        continue
-                    key, val = cells[0].text.strip(), cells[1].text.strip()
-                else:
-                    txt = row.text.strip()
-                    if ":" not in txt:
-                        continue
-                    key, val = [p.strip() for p in txt.split(":", 1)]
-                lk = key.lower()
-                if val:
-                    if "material" in lk:
-                        materials_found.append(val)
-                    elif "weight" in lk and key not in weights:
-                        weights[key] = val
-                    elif ("quantity" in lk or "unit count" in lk) and key not in quantities:
-                        quantities[key] = val
-            except Exception:
-                continue
+SCRAPE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# Scraped product pages by URL; product listings change rarely within a day.
+SCRAPE_CACHE = diskcache.Cache("./scrape_cache")
+SCRAPE_CACHE_TTL = 86400
+
+WEIGHT_RE = re.compile(r"([\d.,]+)\s*([a-zA-Z]+)")
+INT_RE = re.compile(r"\d+")
+
+SPEC_PRIORITY_GROUPS = [
+    ["#productDetails_techSpec_section_1 tr", "#productDetails_techSpec_section_2 tr"],
+    ["table.a-keyvalue tr"],
+    ["#productOverview_feature_div table tr"],
+    ["#detailBullets_feature_div li", "#productDetails_detailBullets_sections1 tr"]
+]
+
+# One pass over each spec key finds every category keyword it contains,
+# instead of a separate substring scan per keyword.
+SPEC_KEY_AUTOMATON = ahocorasick.Automaton()
+for keyword, category in [("material", "material"), ("weight", "weight"), ("quantity", "quantity"), ("unit count", "quantity")]:
+    SPEC_KEY_AUTOMATON.add_word(keyword, category)
+SPEC_KEY_AUTOMATON.make_automaton()
+
+def classify_spec_key(lower_key: str) -> set:
+    return {category for _, category in SPEC_KEY_AUTOMATON.iter(lower_key)}
+
+def pick_specs(row_groups) -> dict:
+    """
+    Classify (key, value) spec rows, one iterable of rows per priority group.
+    Lower-priority groups are skipped once every category has been found.
+    """
+    materials_found, weights, quantities = [], {}, {}
+    for rows in row_groups:
+        if materials_found and weights and quantities:
+            break
+        for key, val in rows:
+            if val:
+                categories = classify_spec_key(key.lower())
+                if "material" in categories:
+                    materials_found.append(val)
+                elif "weight" in categories and key not in weights:
+                    weights[key] = val
+                elif "quantity" in categories and key not in quantities:
+                    quantities[key] = val
     return {"materials_found": materials_found, "weights": weights, "quantities": quantities}
 
+def spec_rows_in_order(tree: LexborHTMLParser, selectors: list):
+    # Selector by selector, like the original scraper: a combined selector list
+    # would return rows in document order and change which row wins in pick_specs.
+    for selector in selectors:
+        yield from tree.css(selector)
+
+def html_spec_rows(tree: LexborHTMLParser, selectors: list):
+    for row in spec_rows_in_order(tree, selectors):
+        if row.tag == "tr":
+            cells = row.css("th") + row.css("td")
+            if len(cells) < 2:
+                continue
+            key, val = cells[0].text(separator=" ", strip=True), cells[1].text(separator=" ", strip=True)
+        else:
+            txt = row.text(separator=" ", strip=True)
+            if ":" not in txt:
+                continue
+            key, val = [p.strip() for p in txt.split(":", 1)]
+        yield key, val
+
+# Reads every priority group's (key, value) rows in the browser with one
+# execute_script call, instead of a WebDriver round-trip per row and cell.
+SPEC_ROWS_JS = """
+return arguments[0].map(selectors => {
+    const out = [];
+    selectors.flatMap(selector => [...document.querySelectorAll(selector)]).forEach(row => {
+        let key, val;
+        if (row.tagName === 'TR') {
+            const cells = [...row.querySelectorAll('th'), ...row.querySelectorAll('td')];
+            if (cells.length < 2) return;
+            key = cells[0].innerText;
+            val = cells[1].innerText;
+        } else {
+            const txt = row.innerText.trim();
+            const i = txt.indexOf(':');
+            if (i < 0) return;
+            key = txt.slice(0, i);
+            val = txt.slice(i + 1);
+        }
+        out.push([key.trim(), val.trim()]);
+    });
+    return out;
+});
+"""
+
+def extract_specs(tree: LexborHTMLParser) -> dict:
+    return pick_specs(html_spec_rows(tree, selectors) for selectors in SPEC_PRIORITY_GROUPS)
+
+def extract_specs_selenium(driver) -> dict:
+    try:
+        row_groups = driver.execute_script(SPEC_ROWS_JS, SPEC_PRIORITY_GROUPS)
+    except Exception:
+        row_groups = []
+    return pick_specs(row_groups)
+
 def parse_weight(weight_str):
     if not weight_str:
         return None, None
-    match = re.search(r"([\d.,]+)\s*([a-zA-Z]+)", weight_str)
+    match = WEIGHT_RE.search(weight_str)
     if match:
         return match.group(1).replace(",", ""), match.group(2)
     return weight_str, None
 
-def scrape_amazon_product(url: str, headless=True):
+def build_product_data(name: str, image_url: Optional[str], picked: dict) -> dict:
+    first_weight_val = next(iter(picked["weights"].values()), None)
+    first_quantity_val = next(iter(picked["quantities"].values()), "1")
+    weight_value_str, weight_unit = parse_weight(first_weight_val)
+    weight_value = float(weight_value_str) if weight_value_str else 1.0
+
+    net_quantity_match = INT_RE.search(str(first_quantity_val))
+    net_quantity = int(net_quantity_match.group()) if net_quantity_match else 1
+
+    return {
+        "name": name,
+        "image_url": image_url,
+        "materials_found": picked["materials_found"],
+        "weights": list(picked["weights"].items()),
+        "net_quantities": list(picked["quantities"].items()),
+        "weight_value": weight_value,
+        "weight_unit": weight_unit,
+        "net_quantity": net_quantity,
+    }
+
+async def scrape_amazon_product(url: str) -> dict:
+    product_data = SCRAPE_CACHE.get(url)
+    if product_data is not None:
+        return product_data
+
+    # Amazon renders the title, image and detail tables server-side, so a plain
+    # HTTP fetch over the shared pool is enough for the common case.
+    response = await get_client().get(url, headers=SCRAPE_HEADERS, follow_redirects=True)
+    tree = LexborHTMLParser(response.text)
+
+    title = tree.css_first("#productTitle")
+    if title is None:
+        # CAPTCHA or JS-only variant: render the page in a real browser instead.
+        print("⚠️ productTitle missing from HTML response. Falling back to Selenium...")
+        product_data = await asyncio.to_thread(scrape_amazon_product_selenium, url)
+    else:
+        image = tree.css_first("#landingImage")
+        image_url = image.attributes.get("src") if image is not None else None
+        product_data = build_product_data(title.text(separator=" ", strip=True), image_url, extract_specs(tree))
+
+    SCRAPE_CACHE.set(url, product_data, expire=SCRAPE_CACHE_TTL)
+    return product_data
+
+# --- Selenium driver pool ---
+# Chrome takes seconds to start, so fallback scrapes lease warm drivers instead of
+# spawning one per request. Drivers are created lazily, up to DRIVER_POOL_SIZE.
+DRIVER_POOL_SIZE = 4
+# Stylesheets stay allowed: Selenium's .text and innerText depend on layout, and
+# without CSS, hidden nodes would leak into the title and spec cells.
+BLOCKED_RESOURCE_URLS = [
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.svg",
+    "*.woff", "*.woff2", "*.ttf", "*.mp4",
+    "*amazon-adsystem.com*", "*fls-na.amazon.*", "*fls-eu.amazon.*", "*unagi.amazon.*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+]
+_driver_pool = queue.Queue(maxsize=DRIVER_POOL_SIZE)
+_driver_lock = threading.Lock()
+_drivers_created = 0
+# Queued in place of a driver that was dropped; whoever gets it creates a new one.
+_EMPTY_SLOT = object()
+
+# Selenium is only needed by the scraping fallback, so it is imported on first
+# use instead of at startup.
+def new_driver(headless=True):
+    from selenium import webdriver
+
     options = webdriver.ChromeOptions()
     if headless:
         options.add_argument("--headless=new")
+    # Return from driver.get() at DOMContentLoaded instead of waiting for every ad and tracker.
+    options.page_load_strategy = "eager"
+    # Product images are never read; skipping them cuts most of the page weight.
+    options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    driver = webdriver.Chrome(options=options)
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_RESOURCE_URLS})
+    return driver
+
+def lease_driver():
+    global _drivers_created
+    try:
+        driver = _driver_pool.get_nowait()
+    except queue.Empty:
+        with _driver_lock:
+            create = _drivers_created < DRIVER_POOL_SIZE
+            if create:
+                _drivers_created += 1
+        driver = _EMPTY_SLOT if create else _driver_pool.get()
+    if driver is not _EMPTY_SLOT:
+        return driver
+    try:
+        return new_driver()
+    except Exception:
+        free_slot()
+        raise
+
+def free_slot():
+    # Hand the slot of a dropped driver to the next (possibly blocked) caller,
+    # which then starts a fresh driver in its place.
+    global _drivers_created
+    try:
+        _driver_pool.put_nowait(_EMPTY_SLOT)
+    except queue.Full:
+        with _driver_lock:
+            _drivers_created -= 1
+
+def release_driver(driver):
+    try:
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+        _driver_pool.put_nowait(driver)
+        return
+    except Exception:
+        pass
+    # The driver is broken: drop it and free its slot for a fresh one.
+    try:
+        driver.quit()
+    except Exception:
+        pass
+    free_slot()
+
+def close_drivers():
+    global _drivers_created
+    while True:
+        try:
+            driver = _driver_pool.get_nowait()
+        except queue.Empty:
+            break
+        if driver is not _EMPTY_SLOT:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        with _driver_lock:
+            _drivers_created -= 1
+
+def scrape_amazon_product_selenium(url: str):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    driver = lease_driver()
     try:
-        driver = webdriver.Chrome(options=options)
         driver.get(url)
-        time.sleep(3)
+        # Wait only as long as the title actually takes to appear.
+        WebDriverWait(driver, 8).until(EC.presence_of_element_located((By.ID, "productTitle")))
 
         name = driver.find_element(By.ID, "productTitle").text.strip()
         image_url = driver.find_element(By.ID, "landingImage").get_attribute("src")
 
-        picked = extract_specs(driver)
-        first_weight_val = next(iter(picked["weights"].values()), None)
-        first_quantity_val = next(iter(picked["quantities"].values()), "1")
-        weight_value_str, weight_unit = parse_weight(first_weight_val)
-        weight_value = float(weight_value_str) if weight_value_str else 1.0
-
-        net_quantity_match = re.search(r'\d+', str(first_quantity_val))
-        net_quantity = int(net_quantity_match.group()) if net_quantity_match else 1
-
-        driver.quit()
-        return {
-            "name": name,
-            "image_url": image_url,
-            "materials_found": picked["materials_found"],
-            "weights": list(picked["weights"].items()),
-            "net_quantities": list(picked["quantities"].items()),
-            "weight_value": weight_value,
-            "weight_unit": weight_unit,
-            "net_quantity": net_quantity,
-        }
-    except Exception as e:
-        if 'driver' in locals():
-            driver.quit()
-        raise e
+        picked = extract_specs_selenium(driver)
+        return build_product_data(name, image_url, picked)
+    finally:
+        release_driver(driver)
 
 # --- Carbon Logic ---
-def calculate_carbon_footprint(material: Optional[str], weight_in_kg: float, net_quantity: float, product_data: dict, ef_df: pd.DataFrame):
+def lookup_carbon_footprint(material: Optional[str], weight_in_kg: float, net_quantity: float, ef_map: Dict[str, float]) -> Optional[float]:
     # If we found a direct material match in our database, use it for a precise calculation.
+    # This is the deterministic fast path: the LLM is only reached when it misses.
     if material:
-        ef_row = ef_df[ef_df['material_clean'] == material]
-        if not ef_row.empty:
-            emission_factor = float(ef_row.iloc[0]['kg CO2 eq/kg'])
+        emission_factor = ef_map.get(material)
+        if emission_factor is not None:
+            ESTIMATES.labels(path="deterministic").inc()
             return weight_in_kg * net_quantity * emission_factor
+    return None
+
+def build_llm_description(product_data: dict, weight_in_kg: float, net_quantity: float) -> str:
+    # Create a detailed description for the LLM
+    description = f"Product: {product_data.get('name', 'N/A')}, Weight: {weight_in_kg:.3f} kg, Quantity: {net_quantity}"
+
+    if product_data.get('materials_found'):
+        materials_str = ", ".join(product_data['materials_found'])
+        description += f", Scraped Material Info: {materials_str}"
+        print("Using LLM estimator")
+    return description
+
+def fallback_carbon_footprint(weight_in_kg: float, net_quantity: float) -> float:
+    print("Using Fallback")
+    return weight_in_kg * net_quantity * 2.5
+
+async def calculate_carbon_footprint(material: Optional[str], weight_in_kg: float, net_quantity: float, product_data: dict, ef_map: Dict[str, float]):
+    carbon_footprint = lookup_carbon_footprint(material, weight_in_kg, net_quantity, ef_map)
+    if carbon_footprint is not None:
+        return carbon_footprint
 
     # Fallback to LLM estimation if material is unknown or not in our database.
     try:
         print("⚠️ Material not in dataset. Attempting carbon estimation via LLM...")
-        # Create a detailed description for the LLM
-        description = f"Product: {product_data.get('name', 'N/A')}, Weight: {weight_in_kg:.3f} kg, Quantity: {net_quantity}"
- 
-        if product_data.get('materials_found'):
-            materials_str = ", ".join(product_data['materials_found'])
-            description += f", Scraped Material Info: {materials_str}"
-            print("Using LLM estimator")
-
-        return float(estimate_carbon(description))
+        description = build_llm_description(product_data, weight_in_kg, net_quantity)
+        return float(await estimate_carbon_queued(description))
     except Exception as e:
         print(f"Carbon estimator LLM failed: {e}. Using default fallback.")
-        print("Using Fallback")
-        return weight_in_kg * net_quantity * 2.5
+        return fallback_carbon_footprint(weight_in_kg, net_quantity)
+
+MAX_RECOMMENDATIONS = 10
+# Validates the whole top-N list in one call instead of one model at a time.
+RECOMMENDATIONS_ADAPTER = TypeAdapter(List[Recommendation])
+
+def score_category(product_name: str) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    Find the product's category and compute the footprint of every product in it.
+    Independent of the analyzed footprint, so it can run while that is estimated.
+    """
+    matched_category = find_category(product_name)
+    if not matched_category:
+        return None, None
 
-def get_recommendations(product_name: str, analyzed_carbon_footprint: float) -> List[Recommendation]:
-    try:
-        products_df = pd.read_csv('amazon_products.csv')
-        ef_df = pd.read_csv('emission_factor_dataset.csv', sep='\t')
-        
-        ef_df.rename(columns={ef_df.columns[0]: 'Material', ef_df.columns[2]: 'kg CO2 eq/kg'}, inplace=True)
-        ef_df['material_clean'] = ef_df['Material'].str.strip().str.lower()
-
-        product_categories = products_df['Search Query'].dropna().unique()
-        sorted_categories = sorted(product_categories, key=len, reverse=True)
-        
-        matched_category = None
-        lower_product_name = product_name.lower()
-        for category in sorted_categories:
-            if category.lower() in lower_product_name:
-                matched_category = category
-                break
-        
-        if not matched_category:
-            return []
+    products = PRODUCTS_BY_CATEGORY[matched_category]
+    carbon_footprints = np.round(products['weight'] * products['quantity'] * products['emission_factor'], 3)
+    return products, carbon_footprints
 
-        category_products_df = products_df[products_df['Search Query'] == matched_category].copy()
-        category_products_df = category_products_df[category_products_df['Title'] != product_name]
-        
-        if category_products_df.empty:
+def get_recommendations(product_name: str, analyzed_carbon_footprint: float, scored: Optional[tuple] = None) -> List[Recommendation]:
+    try:
+        products, carbon_footprints = scored if scored is not None else score_category(product_name)
+        if products is None:
             return []
-            
-        category_products_df['material_clean'] = category_products_df['Material'].str.strip().str.lower()
-        merged_df = pd.merge(
-            category_products_df,
-            ef_df[['material_clean', 'kg CO2 eq/kg']],
-            on='material_clean',
-            how='left'
-        )
-        merged_df['kg CO2 eq/kg'].fillna(2.5, inplace=True)
 
-        weights = pd.to_numeric(merged_df['Weight Value'], errors='coerce')
-        quantities = pd.to_numeric(merged_df['Net Quantity'], errors='coerce')
-        emission_factors = pd.to_numeric(merged_df['kg CO2 eq/kg'], errors='coerce')
-
-        merged_df['carbon_footprint'] = (weights * quantities * emission_factors).round(3)
-        merged_df.dropna(subset=['carbon_footprint'], inplace=True)
-        
+        valid = (products['title'] != product_name) & ~np.isnan(carbon_footprints)
         if analyzed_carbon_footprint is not None:
-             merged_df = merged_df[merged_df['carbon_footprint'] < analyzed_carbon_footprint]
-
-        sorted_recommendations = merged_df.sort_values(by='carbon_footprint').head(10)
-        
-        final_list = [
-            Recommendation(
-                product_name=row['Title'],
-                image_url=row['img_url'],
-                material=row['Material'],
-                carbon_footprint=row['carbon_footprint'],
-                link=row['Link']
-            ) for _, row in sorted_recommendations.iterrows()
+            valid &= carbon_footprints < analyzed_carbon_footprint
+
+        # Partial selection of the lowest footprints, then sort just those
+        # (ties keep catalog order).
+        candidates = np.flatnonzero(valid)
+        if len(candidates) > MAX_RECOMMENDATIONS:
+            lowest = np.argpartition(carbon_footprints[candidates], MAX_RECOMMENDATIONS)[:MAX_RECOMMENDATIONS]
+            candidates = candidates[lowest]
+        top = candidates[np.lexsort((candidates, carbon_footprints[candidates]))]
+
+        records = [
+            {
+                'product_name': products['title'][i],
+                'image_url': products['img_url'][i],
+                'material': products['material'][i],
+                'carbon_footprint': float(carbon_footprints[i]),
+                'link': products['link'][i],
+            } for i in top
         ]
-        return final_list
+        return RECOMMENDATIONS_ADAPTER.validate_python(records)
 
     except Exception as e:
         print(f"Error getting recommendations: {e}")
         return []
 
 
+async def prepare_analysis(url: str, known_materials: tuple) -> Tuple[dict, float, Optional[str]]:
+    product_data = await scrape_amazon_product(url)
+    weight_in_kg = convert_to_kg(product_data["weight_value"], product_data.get("weight_unit"))
+    best_material_match = next((r for m in product_data["materials_found"] if (r := find_best_material_match(m, known_materials))), None)
+    return product_data, weight_in_kg, best_material_match
+
+def build_analysis_response(product_data: dict, weight_in_kg: float, best_material_match: Optional[str], carbon_footprint: float, scored: Optional[tuple] = None) -> ProductAnalysisResponse:
+    final_materials = [("Primary Material", best_material_match)] if best_material_match else [
+        ("Scraped Text", m) for m in product_data.get('materials_found', [])
+    ]
+
+    recommendations = get_recommendations(product_data["name"], carbon_footprint, scored)
+
+    return ProductAnalysisResponse(
+        success=True,
+        product_name=product_data["name"],
+        image_url=product_data["image_url"],
+        carbon_footprint=round(carbon_footprint, 3),
+        material=best_material_match or (product_data["materials_found"][0] if product_data["materials_found"] else "Unknown"),
+        weight_value=f"{weight_in_kg:.3f}",
+        weight_unit="kg",
+        materials=final_materials,
+        weights=product_data["weights"],
+        net_quantities=product_data["net_quantities"],
+        recommendations=recommendations
+    )
+
+def build_error_response(error: Exception) -> ProductAnalysisResponse:
+    return ProductAnalysisResponse(
+        success=False, product_name="Error", error=str(error), image_url=None,
+        carbon_footprint=None, material=None, weight_value=None, weight_unit=None,
+        materials=[], weights=[], net_quantities=[], recommendations=[]
+    )
+
+# --- Lifecycle ---
+WARM_UP_URLS = ["https://www.amazon.in/", "https://www.amazon.com/"]
+
+# Threads for blocking work (the Selenium fallback) so it never stalls the event loop.
+THREADPOOL_SIZE = 32
+
+@app.on_event("startup")
+async def startup():
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=THREADPOOL_SIZE, thread_name_prefix="carbonwise")
+    )
+    client = get_client()
+    start_batch_worker()
+
+    # Pre-open pooled connections so the first /analyze skips the handshakes.
+    results = await asyncio.gather(
+        llm_warm_up(),
+        *(client.head(url, headers=SCRAPE_HEADERS, timeout=3) for url in WARM_UP_URLS),
+        return_exceptions=True
+    )
+    for r in results:
+        if isinstance(r, Exception):
+            print(f"Warm-up request failed (ignored): {r}")
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_batch_worker()
+    await close_client()
+    await asyncio.to_thread(close_drivers)
+
 # --- API Endpoints ---
 @app.get("/")
 async def root():
@@ -253,46 +593,64 @@ async def root():
 @app.post("/analyze", response_model=ProductAnalysisResponse)
 async def analyze_product(request: ProductAnalysisRequest):
     try:
-        product_data = scrape_amazon_product(request.url)
-        weight_in_kg = convert_to_kg(product_data["weight_value"], product_data.get("weight_unit"))
+        product_data, weight_in_kg, best_material_match = await prepare_analysis(request.url, KNOWN_MATERIALS)
 
-        ef_df = pd.read_csv('emission_factor_dataset.csv', sep='\t')
-        ef_df.rename(columns={ef_df.columns[0]: 'Material', ef_df.columns[2]: 'kg CO2 eq/kg'}, inplace=True)
-        ef_df['material_clean'] = ef_df['Material'].str.strip().str.lower()
-        known_materials = sorted(ef_df['material_clean'].dropna().unique(), key=len, reverse=True)
-        
-        best_material_match = next((find_best_material_match(m, known_materials) for m in product_data["materials_found"] if find_best_material_match(m, known_materials)), None)
-
-        carbon_footprint = calculate_carbon_footprint(
+        # Score the category's catalog in a worker thread while the footprint
+        # (possibly an LLM call) is being computed; only the final threshold
+        # filter has to wait for it.
+        scoring = asyncio.ensure_future(asyncio.to_thread(score_category, product_data["name"]))
+        carbon_footprint = await calculate_carbon_footprint(
             best_material_match, weight_in_kg,
-            product_data["net_quantity"], product_data, ef_df
-        )
-
-        final_materials = [("Primary Material", best_material_match)] if best_material_match else [
-            ("Scraped Text", m) for m in product_data.get('materials_found', [])
-        ]
-        
-        recommendations = get_recommendations(product_data["name"], carbon_footprint)
-
-        return ProductAnalysisResponse(
-            success=True,
-            product_name=product_data["name"],
-            image_url=product_data["image_url"],
-            carbon_footprint=round(carbon_footprint, 3),
-            material=best_material_match or (product_data["materials_found"][0] if product_data["materials_found"] else "Unknown"),
-            weight_value=f"{weight_in_kg:.3f}",
-            weight_unit="kg",
-            materials=final_materials,
-            weights=product_data["weights"],
-            net_quantities=product_data["net_quantities"],
-            recommendations=recommendations
+            product_data["net_quantity"], product_data, EF_MAP
         )
+        try:
+            scored = await scoring
+        except Exception as e:
+            print(f"Error getting recommendations: {e}")
+            scored = (None, None)
+        return build_analysis_response(product_data, weight_in_kg, best_material_match, carbon_footprint, scored)
     except Exception as e:
-        return ProductAnalysisResponse(
-            success=False, product_name="Error", error=str(e), image_url=None,
-            carbon_footprint=None, material=None, weight_value=None, weight_unit=None,
-            materials=[], weights=[], net_quantities=[], recommendations=[]
-        )
+        return build_error_response(e)
+
+@app.post("/analyze_batch", response_model=BatchAnalysisResponse)
+async def analyze_products_batch(request: BatchAnalysisRequest):
+    # Products whose material is in the dataset are computed directly; the rest
+    # are row-marshaled into a single LLM call instead of one call per product.
+    prepared = await asyncio.gather(
+        *(prepare_analysis(url, KNOWN_MATERIALS) for url in request.urls), return_exceptions=True
+    )
+    footprints, pending = [], []
+    for i, item in enumerate(prepared):
+        if isinstance(item, Exception):
+            footprints.append(None)
+            continue
+        product_data, weight_in_kg, best_material_match = item
+        footprints.append(lookup_carbon_footprint(best_material_match, weight_in_kg, product_data["net_quantity"], EF_MAP))
+        if footprints[i] is None:
+            pending.append(i)
+
+    if pending:
+        print(f"⚠️ {len(pending)} materials not in dataset. Attempting batched carbon estimation via LLM...")
+        descriptions = [build_llm_description(prepared[i][0], prepared[i][1], prepared[i][0]["net_quantity"]) for i in pending]
+        try:
+            estimates = await estimate_carbon_batch(descriptions)
+        except Exception as e:
+            print(f"Carbon estimator LLM failed: {e}. Using default fallback.")
+            estimates = [None] * len(pending)
+        for i, estimate in zip(pending, estimates):
+            product_data, weight_in_kg, _ = prepared[i]
+            footprints[i] = float(estimate) if estimate is not None else fallback_carbon_footprint(weight_in_kg, product_data["net_quantity"])
+
+    results = []
+    for item, carbon_footprint in zip(prepared, footprints):
+        if isinstance(item, Exception):
+            results.append(build_error_response(item))
+            continue
+        try:
+            results.append(build_analysis_response(*item, carbon_footprint))
+        except Exception as e:
+            results.append(build_error_response(e))
+    return BatchAnalysisResponse(results=results)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)